@@ -4,20 +4,55 @@ For documentation purpose, run the script with -h flag
 
 import os
 import sys
+import csv
 import logging
+import operator
+import itertools
 import collections
 
+import numpy
+
 from argparse import ArgumentParser
 from datetime import datetime as dt
 
 
+###############################################################################
+# constants (shared across calls of the processing steps)
+LAKES_KEEP_FIELDS = frozenset(['FEATURE_ID', 'INTERPRETATION_DATE', 'PROJECT', 'BEC_ZONE_CODE', 'BEC_SUBZONE',
+                               'BEC_VARIANT', 'MAP_LABEL', 'TSA_NUMBER', 'FOR_FL_ID', 'OWNER_TYPE', 'Shape',
+                               'Shape_Area', 'Shape_Length', 'OBJECTID_1', 'Lakes_Prmtr', 'Lakes_Area_Ha'])
+
+BUFFER_KEEP_FIELDS = frozenset(['WATERBODY_POLY_ID', 'BUFF_DIST', 'BEC_ZONE_CODE', 'BEC_SUBZONE', 'BEC_VARIANT',
+                                'HARVEST_DATE', 'PROJ_AGE_1', 'Age_Class', 'BEC_Area_Ha', 'INSIDE_X', 'INSIDE_Y',
+                                'INTERPRETATION_DATE', 'OBJECTID_1', 'OBJECTID', 'Shape', 'Shape_Area', 'Shape_Length',
+                                'Buffer_Distance', 'Buffer_Area', 'Buffer_Prmtr'])
+
+# Readable age categories of the VRI PROJ_AGE_CLASS_CD_1 codes, any other code is AGE_CLASS_DEFAULT
+AGE_CLASSES = {'1': '1-20', '2': '21-40', '3': '41-60', '4': '61-80', '5': '81-100', '6': '101-120',
+               '7': '121-140', '8': '141-250'}
+AGE_CLASS_DEFAULT = '251+'
+
+# Running under the ArcGIS interpreter (rather than a standalone python.exe) routes log messages to arcpy as well
+ARC_ENV = os.path.basename(sys.executable).lower() != 'python.exe'
+
+# ArcGIS Pro runs on Python 3 and ArcMap on Python 2, arcpy is only imported once the module has loaded
+ARC_PRO = sys.version_info[0] >= 3
+
+# Workspace for the intermediate datasets that are not kept
+SCRATCH = 'in_memory'
+
+# Logger shared by every call in the process, built by get_logger
+_LOGGER = None
+
+
 ###############################################################################
 # helper (manipulates handlers for arcpy messaging)
 class ArcPyLogHandler(logging.StreamHandler):
     def emit(self, record):
+        # Messages are passed to the logger with lazy %-style arguments, so merge them the same way logging does
         try:
-            msg = record.msg.format(record.args)
-        except:
+            msg = record.getMessage()
+        except (TypeError, ValueError):
             msg = record.msg
 
         if record.levelno == logging.ERROR:
@@ -34,22 +69,27 @@ class ArcPyLogHandler(logging.StreamHandler):
 # helper (manipulates handlers for the logic of the application)
 def run_app():
     """Run the logic of the application"""
-    gdb, aoi_file, aoi_fld, aoi_name, vri, tsa, tfl, private, bec, fwa, lake_ha, harvest, buffer_dist, dem, roads, \
-        streams, bridges, blocks, fish, logger = get_input_parameters()
+    args, logger = get_input_parameters()
+
+    # Environment settings shared by every step
+    arcpy.env.workspace = args.gdb
+    arcpy.env.overwriteOutput = True
 
-    final_lakes, criteria_lakes, study_area, vri_aoi = extract_lakes(aoi_file, aoi_fld, aoi_name, vri, tsa, tfl,
-                                                                     private, bec, fwa, lake_ha, harvest, gdb, logger)
+    final_lakes, criteria_lakes, criteria_count, study_area, vri_aoi = \
+        extract_lakes(args.aoi_file, args.aoi_fld, args.aoi_name, args.vri, args.tsa, args.tfl, args.private,
+                      args.bec, args.fwa, args.lake_ha, args.harvest, args.gdb, logger)
 
-    lakes, buffer_lakes = buffer_analysis(final_lakes, criteria_lakes, buffer_dist, gdb, logger)
+    lakes, buffer_lakes = buffer_analysis(final_lakes, criteria_lakes, criteria_count, args.buffer, logger)
 
-    watersheds, dem_aoi = watershed_buffer(study_area, dem, lakes, buffer_lakes,
-                                           vri_aoi, roads, streams, bridges, gdb, logger)
+    watersheds, dem_aoi = watershed_buffer(study_area, args.dem, lakes, buffer_lakes,
+                                           vri_aoi, args.roads, args.streams, args.bridges, args.gdb, logger)
 
     watersheds, bec_label_fields, bec_zone_fields, non_forest_fields =\
-        watershed_characteristics(watersheds, final_lakes, streams, tsa, tfl, vri_aoi,
-                                  private, blocks, fish, roads, bec, dem_aoi, gdb, logger)
+        watershed_characteristics(watersheds, final_lakes, args.streams, args.tsa, args.tfl, vri_aoi,
+                                  args.private, args.blocks, args.fish, args.roads, args.bec, dem_aoi, args.gdb,
+                                  args.approx_road_area, logger)
 
-    export_tables(final_lakes, criteria_lakes, watersheds, gdb, bec_label_fields,
+    export_tables(final_lakes, criteria_lakes, criteria_count, watersheds, args.gdb, bec_label_fields,
                   bec_zone_fields, non_forest_fields, logger)
 
 
@@ -59,6 +99,7 @@ def run_app():
 def get_input_parameters():
     """
         Parse arguments and set up logger
+        :return: parsed arguments namespace and logger object
     """
     try:
         parser = ArgumentParser(
@@ -83,57 +124,71 @@ def get_input_parameters():
         parser.add_argument('bridges', help='Path to Coastal Bridges')
         parser.add_argument('blocks', help='Path to Cut Blocks')
         parser.add_argument('fish', help='Path to Fish Observations')
+        parser.add_argument('--approx_road_area', action='store_true',
+                            help='Approximate the watershed road area as road length times 6 m instead of buffering '
+                                 'the roads')
         parser.add_argument('--log_level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
                             help='Log level')
         parser.add_argument('--log_dir', help='Path to Log Directory')
         args = parser.parse_args()
 
-        log_name = 'main_logger'
-        logger = logging.getLogger(log_name)
-        logger.handlers = []
+        logger = get_logger(args.log_level, args.log_dir)
 
-        log_fmt = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        log_file_base_name = os.path.basename(sys.argv[0])
-        log_file_extension = 'log'
-        timestamp = dt.now().strftime('%Y-%m-%d_%H-%M-%S')
-        log_file = '{}_{}.{}'.format(timestamp, log_file_base_name, log_file_extension)
+        return args, logger
 
-        logger.setLevel(args.log_level)
+    except Exception as e:
+        logging.error('Unexpected exception. Program terminating.')
+        raise Exception('Errors exist')
 
-        sh = logging.StreamHandler()
-        sh.setLevel(args.log_level)
-        sh.setFormatter(log_fmt)
-        logger.addHandler(sh)
 
-        if args.log_dir:
-            try:
-                os.makedirs(args.log_dir)
-            except OSError:
-                pass
+def get_logger(log_level, log_dir=None):
+    """
+        Set up the logger for the console, log file and ArcGIS messages. The logger is only built on the first call,
+        later calls in the same process return the same logger
 
-            fh = logging.FileHandler(os.path.join(args.log_dir, log_file))
-            fh.setLevel(args.log_level)
-            fh.setFormatter(log_fmt)
-            logger.addHandler(fh)
+        :param str log_level: Log level
+        :param str log_dir: Path to Log Directory
+    """
+    global _LOGGER
+    if _LOGGER is not None:
+        return _LOGGER
 
-        if os.path.basename(sys.executable).lower() == 'python.exe':
-            arc_env = False
-        else:
-            arc_env = True
+    log_name = 'main_logger'
+    logger = logging.getLogger(log_name)
+    logger.handlers = []
 
-        if arc_env:
-            arc_handler = ArcPyLogHandler()
-            arc_handler.setLevel(args.log_level)
-            arc_handler.setFormatter(log_fmt)
-            logger.addHandler(arc_handler)
+    log_fmt = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    log_file_base_name = os.path.basename(sys.argv[0])
+    log_file_extension = 'log'
+    timestamp = dt.now().strftime('%Y-%m-%d_%H-%M-%S')
+    log_file = '{}_{}.{}'.format(timestamp, log_file_base_name, log_file_extension)
 
-        return args.gdb, args.aoi_file, args.aoi_fld, args.aoi_name, args.vri, args.tsa, args.tfl, args.private,\
-            args.bec, args.fwa, args.lake_ha, args.harvest, args.buffer, args.dem, args.roads, args.streams,\
-            args.bridges, args.blocks, args.fish, logger
+    logger.setLevel(log_level)
 
-    except Exception as e:
-        logging.error('Unexpected exception. Program terminating.')
-        raise Exception('Errors exist')
+    sh = logging.StreamHandler()
+    sh.setLevel(log_level)
+    sh.setFormatter(log_fmt)
+    logger.addHandler(sh)
+
+    if log_dir:
+        try:
+            os.makedirs(log_dir)
+        except OSError:
+            pass
+
+        fh = logging.FileHandler(os.path.join(log_dir, log_file))
+        fh.setLevel(log_level)
+        fh.setFormatter(log_fmt)
+        logger.addHandler(fh)
+
+    if ARC_ENV:
+        arc_handler = ArcPyLogHandler()
+        arc_handler.setLevel(log_level)
+        arc_handler.setFormatter(log_fmt)
+        logger.addHandler(arc_handler)
+
+    _LOGGER = logger
+    return logger
 
 
 def extract_lakes(aoi_file, aoi_fld, aoi_name, vri, tsa, tfl, private, bec, fwa, lake_ha, harvest, working_gdb, logger):
@@ -161,8 +216,6 @@ def extract_lakes(aoi_file, aoi_fld, aoi_name, vri, tsa, tfl, private, bec, fwa,
     logger.info('********************************')
 
     # Variables
-    arcpy.env.workspace = working_gdb
-    field_mappings = arcpy.FieldMappings()
     fld_vri_lake_extract = 'BCLCS_LEVEL_5'
     vri_lake_values = ['LA', 'RE']
     fld_age_class = 'Age_Class'
@@ -172,15 +225,13 @@ def extract_lakes(aoi_file, aoi_fld, aoi_name, vri, tsa, tfl, private, bec, fwa,
     fld_gnis_name = 'GNIS_NAME_1'
     fld_lake_area = 'Lakes_Area_Ha'
     fld_lake_prmtr = 'Lakes_Prmtr'
+    fld_inside_x = 'INSIDE_X'
+    fld_inside_y = 'INSIDE_Y'
     fld_bec_label = 'MAP_LABEL'
     null_id_replace = 999900000
 
-    arcpy.env.overwriteOutput = True
-
-    fields_to_keep = ['FEATURE_ID', 'INTERPRETATION_DATE', 'PROJECT', 'BEC_ZONE_CODE', 'BEC_SUBZONE', 'BEC_VARIANT',
-                      'MAP_LABEL', 'TSA_NUMBER', 'FOR_FL_ID', 'OWNER_TYPE', 'Shape', 'Shape_Area', 'Shape_Length',
-                      'OBJECTID_1', fld_bec_label, fld_lake_prmtr, fld_lake_area]
-    lakes_fields_delete = ['INSIDE_Z', 'INSIDE_M', 'Join_Count', 'Join_Count_1', 'Shape_Area_1', 'Shape_Length_1']
+    lake_attribute_fields = ['FEATURE_ID', 'INTERPRETATION_DATE', 'PROJECT', 'BEC_ZONE_CODE', 'BEC_SUBZONE',
+                             'BEC_VARIANT', fld_bec_label, 'TSA_NUMBER', 'FOR_FL_ID', 'OWNER_TYPE']
 
     if aoi_fld == '#':
         aoi_fld = None
@@ -190,22 +241,17 @@ def extract_lakes(aoi_file, aoi_fld, aoi_name, vri, tsa, tfl, private, bec, fwa,
         lake_ha = None
 
     # Creating a VRI value string usable in a SQL statement
-    vri_filter_values = ''
-    for name in vri_lake_values:
-        vri_filter_values += "'" + name.strip("'") + "'"
-        if name != vri_lake_values[-1]:
-            vri_filter_values += ', '
+    vri_filter_values = sql_value_list(vri_lake_values)
 
     # Set up path variables
     aoi_file_study_area = os.path.join(working_gdb, os.path.basename(aoi_file) + '_Study_Area')
     vri_aoi = os.path.join(working_gdb, 'VRI_Study_Area')
-    vri_lakes = os.path.join(working_gdb, 'VRI_Lakes')
-    bec_lakes = os.path.join(working_gdb, 'BEC_Lakes')
-    tsa_lakes = os.path.join(working_gdb, 'VRI_Lakes_TSA')
-    tfl_lakes = os.path.join(working_gdb, 'VRI_Lakes_TFL')
-    private_lakes = os.path.join(working_gdb, 'VRI_Lakes_Private')
-    fwa_lakes = os.path.join(working_gdb, 'VRI_Lakes_FWA')
-    dissolve_lakes = os.path.join(working_gdb, 'VRI_Lakes_Dissolve')
+    vri_lakes = 'vri_lakes_lyr'
+    bec_lakes = os.path.join(SCRATCH, 'BEC_Lakes')
+    tsa_lakes = os.path.join(SCRATCH, 'VRI_Lakes_TSA')
+    tfl_lakes = os.path.join(SCRATCH, 'VRI_Lakes_TFL')
+    private_lakes = os.path.join(SCRATCH, 'VRI_Lakes_Private')
+    fwa_lakes = os.path.join(SCRATCH, 'VRI_Lakes_FWA')
     final_lakes = os.path.join(working_gdb, 'Lakes_Final')
     criteria_lakes = os.path.join(working_gdb, 'Lakes_Criteria')
 
@@ -213,171 +259,122 @@ def extract_lakes(aoi_file, aoi_fld, aoi_name, vri, tsa, tfl, private, bec, fwa,
     logger.info('Extracting AOI...')
     if aoi_fld and aoi_name:
         # Creating an AOI value string usable in a SQL statement
-        aoi_name_list = aoi_name.split(';')
-        aoi_name_values = ''
-        for name in aoi_name_list:
-            aoi_name_values += "'" + name.strip("'") + "'"
-            if name != aoi_name_list[-1]:
-                aoi_name_values += ', '
+        aoi_name_values = sql_value_list(aoi_name.split(';'))
         arcpy.Select_analysis(aoi_file, aoi_file_study_area, '{0} IN ({1})'.format(aoi_fld, aoi_name_values))
     else:
         arcpy.Copy_management(aoi_file, aoi_file_study_area)
 
+    # Make sure the VRI and the overlay layers are spatially indexed before they are clipped and joined to the lakes
+    add_spatial_indexes([vri, bec, tsa, tfl, private, fwa])
+
     # Clip the VRI to the AOI
     logger.info('Clipping VRI to AOI...')
-    arcpy.Clip_analysis(vri, aoi_file_study_area, vri_aoi)
+    clip_features(vri, aoi_file_study_area, vri_aoi)
 
-    # Extract lakes from the VRI using the VRI filter values (LA, RE)on the BCLCS_Level_5 field
+    # Extract lakes from the VRI using the VRI filter values (LA, RE) on the BCLCS_Level_5 field
     logger.info('Extracting Lakes from the VRI...')
-    arcpy.Select_analysis(vri_aoi, vri_lakes, '{0} IN ({1})'.format(fld_vri_lake_extract, vri_filter_values))
-
-    # Delete unnecessary fields
-    fc_fields = [f.name for f in arcpy.ListFields(vri_lakes)]
-    fields_delete = list(set(fc_fields) - set(fields_to_keep))
-    arcpy.DeleteField_management(vri_lakes, fields_delete)
-
-    # Join the BEC Label field to the VRI Lakes using spatial join
-    logger.info('Joining BEC Label to VRI Lakes...')
-    field_mappings.addTable(bec)
-    field_mappings.addTable(vri_lakes)
-
-    # Removing fields that should not be included in the join
-    for field in field_mappings.fields:
-        if field.name not in fields_to_keep:
-            field_mappings.removeFieldMap(field_mappings.findFieldMapIndex(field.name))
-    arcpy.SpatialJoin_analysis(vri_lakes, bec, bec_lakes, 'JOIN_ONE_TO_ONE', 'KEEP_ALL', field_mappings, 'WITHIN', '')
-
-    # Joining the TSA to the lakes
-    field_mappings.addTable(tsa)
-    field_mappings.addTable(bec_lakes)
-    logger.info('Joining TSA Information to VRI Lakes...')
-    for field in field_mappings.fields:
-        if field.name not in fields_to_keep:
-            field_mappings.removeFieldMap(field_mappings.findFieldMapIndex(field.name))
-    arcpy.SpatialJoin_analysis(bec_lakes, tsa, tsa_lakes, 'JOIN_ONE_TO_ONE', 'KEEP_ALL', field_mappings, 'WITHIN', '')
-
-    # Joining the TFL to the lakes
-    logger.info('Joining TFL Information to VRI Lakes...')
-    field_mappings.addTable(tfl)
-    field_mappings.addTable(tsa_lakes)
-
-    # Removing fields that should not be included in the join
-    for field in field_mappings.fields:
-        if field.name not in fields_to_keep:
-            field_mappings.removeFieldMap(field_mappings.findFieldMapIndex(field.name))
-    arcpy.SpatialJoin_analysis(tsa_lakes, tfl, tfl_lakes, 'JOIN_ONE_TO_ONE', 'KEEP_ALL', field_mappings, 'WITHIN', '')
-
-    # Joining Private Land to the lakes
-    logger.info('Joining Private Land Information to VRI Lakes...')
-    field_mappings.addTable(private)
-    field_mappings.addTable(tfl_lakes)
-
-    # Removing fields that should not be included in the join
-    for field in field_mappings.fields:
-        if field.name not in fields_to_keep:
-            field_mappings.removeFieldMap(field_mappings.findFieldMapIndex(field.name))
-    # Spatial joins to TFL layer
-    arcpy.SpatialJoin_analysis(tfl_lakes, private, private_lakes, 'JOIN_ONE_TO_ONE',
-                               'KEEP_ALL', field_mappings, 'WITHIN', '')
+    arcpy.MakeFeatureLayer_management(vri_aoi, vri_lakes,
+                                      '{0} IN ({1})'.format(fld_vri_lake_extract, vri_filter_values))
+
+    # Join the BEC Label, TSA, TFL and Private Land information to the VRI Lakes
+    overlays = [('BEC Label', bec, bec_lakes),
+                ('TSA Information', tsa, tsa_lakes),
+                ('TFL Information', tfl, tfl_lakes),
+                ('Private Land Information', private, private_lakes)]
+    join_lakes = vri_lakes
+    for overlay_name, overlay, overlay_lakes in overlays:
+        logger.info('Joining %s to VRI Lakes...', overlay_name)
+        field_mappings = build_field_mappings([overlay, join_lakes], LAKES_KEEP_FIELDS)
+        arcpy.SpatialJoin_analysis(join_lakes, overlay, overlay_lakes, 'JOIN_ONE_TO_ONE', 'KEEP_ALL',
+                                   field_mappings, 'WITHIN', '')
+        join_lakes = overlay_lakes
 
     # Joining FWA Lakes to the VRI Lakes
     logger.info('Joining FWA Lake Information to VRI Lakes...')
-    arcpy.SpatialJoin_analysis(private_lakes, fwa, fwa_lakes, '', 'KEEP_ALL', '', 'INTERSECT')
+    fwa_lyr = select_layer_by_location(fwa, 'fwa_lyr', private_lakes)
+    arcpy.SpatialJoin_analysis(private_lakes, fwa_lyr, fwa_lakes, '', 'KEEP_ALL', '', 'INTERSECT')
+    arcpy.Delete_management(fwa_lyr)
     arcpy.DeleteField_management(fwa_lakes, 'Join_Count')
 
-    # Replace any NULL Poly ID values with an incrementing ID value
-    logger.info('Filling NULL Values in ' + fld_poly_id + '...')
-    with arcpy.da.UpdateCursor(fwa_lakes, fld_poly_id) as u_cursor:
-        for row in u_cursor:
-            if not row[0]:
-                row[0] = null_id_replace
-                null_id_replace += 1
-                u_cursor.updateRow(row)
-
-    logger.info('Dissolving Lakes based on ' + fld_poly_id + '...')
-    arcpy.Dissolve_management(fwa_lakes, dissolve_lakes, [fld_poly_id, fld_wtrshd_50k, fld_gnis_name])
-
-    logger.info('Applying Attributes...')
-    arcpy.SpatialJoin_analysis(dissolve_lakes, private_lakes, final_lakes, '', 'KEEP_ALL', '', 'INTERSECT')
-
-    # Create and calculates area, perimeter, centroid x/y fields
+    # Replace any NULL Poly ID values with a unique ID value offset by the ObjectID
+    logger.info('Filling NULL Values in %s...', fld_poly_id)
+    null_lyr = arcpy.MakeFeatureLayer_management(fwa_lakes, 'null_lyr', '{0} IS NULL'.format(fld_poly_id))
+    arcpy.CalculateField_management(null_lyr, fld_poly_id,
+                                    '{0} + !{1}!'.format(null_id_replace, arcpy.Describe(fwa_lakes).OIDFieldName),
+                                    'PYTHON')
+    arcpy.Delete_management(null_lyr)
+
+    # The joined attributes are carried through the dissolve as FIRST statistics and renamed back afterwards
+    logger.info('Dissolving Lakes based on %s...', fld_poly_id)
+    arcpy.Dissolve_management(fwa_lakes, final_lakes, [fld_poly_id, fld_wtrshd_50k, fld_gnis_name],
+                              [[field, 'FIRST'] for field in lake_attribute_fields])
+    alter_fields(final_lakes, [['FIRST_' + field, field] for field in lake_attribute_fields])
+
+    # Create and calculates area, perimeter, centroid x/y fields from a single read of each lake geometry
     logger.info('Adding Geometry Information...')
-    arcpy.AddField_management(final_lakes, fld_lake_area, 'Double')
-    arcpy.CalculateField_management(final_lakes, fld_lake_area, '!SHAPE.area@HECTARES!', 'PYTHON')
-    arcpy.AddField_management(final_lakes, fld_lake_prmtr, 'Double')
-    arcpy.CalculateField_management(final_lakes, fld_lake_prmtr, '!SHAPE.length@METERS!', 'PYTHON')
-    arcpy.AddGeometryAttributes_management(final_lakes, 'CENTROID_INSIDE')
-    arcpy.DeleteField_management(final_lakes, lakes_fields_delete)
+    add_fields(final_lakes, [[fld_lake_area, 'DOUBLE'], [fld_lake_prmtr, 'DOUBLE'],
+                             [fld_inside_x, 'DOUBLE'], [fld_inside_y, 'DOUBLE']])
+    with arcpy.da.UpdateCursor(final_lakes, ['SHAPE@', fld_lake_area, fld_lake_prmtr,
+                                             fld_inside_x, fld_inside_y]) as u_cursor:
+        for row in u_cursor:
+            centroid = row[0].centroid
+            row[1] = row[0].getArea('PLANAR', 'HECTARES')
+            row[2] = row[0].getLength('PLANAR', 'METERS')
+            row[3] = centroid.X
+            row[4] = centroid.Y
+            u_cursor.updateRow(row)
 
     # Output statistics to the logger
     logger.info('--------------------------------')
     lake_count = 0
     all_lakes = ''
-    if not lake_ha and harvest == 'NONE':
-        logger.info('No criteria selection was used')
-        all_lakes = ', all lakes will be used in the analysis'
-    elif not lake_ha and harvest != 'NONE':
-        arcpy.Select_analysis(final_lakes, criteria_lakes, harvest)
+    criteria = []
+    if harvest != 'NONE':
+        criteria.append('({0})'.format(harvest))
+    if lake_ha:
+        # The minimum size is written into the SQL as a number, so anything that is not numeric is rejected here
+        criteria.append('{0} >= {1}'.format(fld_lake_area, float(lake_ha)))
+
+    if criteria:
+        where_clause = ' AND '.join(criteria)
+        logger.info('Extracting Lakes using criteria (%s)', where_clause)
+        arcpy.Select_analysis(final_lakes, criteria_lakes, where_clause)
         lake_count = int(arcpy.GetCount_management(criteria_lakes).getOutput(0))
-        logger.info('Extracting Lakes using Administrative Boundary Criteria ({0})'.format(harvest))
-    elif lake_ha and harvest == 'NONE':
-        arcpy.Select_analysis(final_lakes, criteria_lakes, fld_lake_area + '{0} >= {1}'.format(fld_lake_area, lake_ha))
-        lake_count = int(arcpy.GetCount_management(criteria_lakes).getOutput(0))
-        logger.info('Extracting Lakes using Minimum Lake Size Criteria (Area >= {0} Ha)'.format(lake_ha))
     else:
-        arcpy.Select_analysis(final_lakes, criteria_lakes, 
-                              '({0}) AND {1} >= {2}'.format(harvest, fld_lake_area, lake_ha))
-        lake_count = int(arcpy.GetCount_management(criteria_lakes).getOutput(0))
-        logger.info('Extracting Lakes using Administrative Boundary ({0}) and '
-                    'Minimum Lake Size Criteria (Area >= {1} Ha)'.format(harvest, lake_ha))
-    logger.info('There are {0} lake(s) that have been selected{1}'.format(lake_count, all_lakes))
+        logger.info('No criteria selection was used')
+        all_lakes = ', all lakes will be used in the analysis'
+    logger.info('There are %s lake(s) that have been selected%s', lake_count, all_lakes)
     logger.info('--------------------------------')
 
     # Create and categorize PROJ_AGE_CLASS_CD_1 into readable age categories
-    arcpy.AddField_management(vri_aoi, fld_age_class, 'TEXT', '10')
-    with arcpy.da.UpdateCursor(vri_aoi, [fld_proj_age, fld_age_class]) as u_cursor:
-        for row in u_cursor:
-            if row[0] == '1':
-                row[1] = '1-20'
-            elif row[0] == '2':
-                row[1] = '21-40'
-            elif row[0] == '3':
-                row[1] = '41-60'
-            elif row[0] == '4':
-                row[1] = '61-80'
-            elif row[0] == '5':
-                row[1] = '81-100'
-            elif row[0] == '6':
-                row[1] = '101-120'
-            elif row[0] == '7':
-                row[1] = '121-140'
-            elif row[0] == '8':
-                row[1] = '141-250'
-            else:
-                row[1] = '251+'
-            u_cursor.updateRow(row)
+    proj_ages = arcpy.da.TableToNumPyArray(vri_aoi, ['OID@', fld_proj_age], null_value={fld_proj_age: ''})
+    age_classes = numpy.zeros(len(proj_ages), dtype=[('VRI_OID', proj_ages.dtype['OID@']), (fld_age_class, '<U10')])
+    age_classes['VRI_OID'] = proj_ages['OID@']
+    age_classes[fld_age_class] = AGE_CLASS_DEFAULT
+    for proj_age, age_class in AGE_CLASSES.items():
+        age_classes[fld_age_class][proj_ages[fld_proj_age] == proj_age] = age_class
+    arcpy.da.ExtendTable(vri_aoi, arcpy.Describe(vri_aoi).OIDFieldName, age_classes, 'VRI_OID')
 
     # Delete any intermediate files
     logger.info('Deleting Intermediate Files')
-    for fc in [vri_lakes, bec_lakes, tsa_lakes, tfl_lakes, private_lakes, fwa_lakes, dissolve_lakes]:
-        arcpy.Delete_management(fc)
+    delete_datasets([vri_lakes, bec_lakes, tsa_lakes, tfl_lakes, private_lakes, fwa_lakes])
 
     logger.info('********************************')
     logger.info('Completed Step 1 - Extract Lakes Process')
     logger.info('********************************')
 
-    return final_lakes, criteria_lakes, aoi_file_study_area, vri_aoi
+    return final_lakes, criteria_lakes, lake_count, aoi_file_study_area, vri_aoi
 
 
-def buffer_analysis(lakes_final, lakes_criteria, buffer_dist, working_gdb, logger):
+def buffer_analysis(lakes_final, lakes_criteria, criteria_count, buffer_dist, logger):
     """
     - Selects lakes based of identified boundaries (TSA, TFL, Private Land, etc)
     - Creates three buffers around the selected lake
 
     :param str lakes_final: Lakes_Final from Extract Lakes
     :param str lakes_criteria: Lakes_Criteria from Extract Lakes
+    :param int criteria_count: Number of lakes in Lakes_Criteria (0 if no selection criteria was used)
     :param str buffer_dist: Buffer distances for lakes (comma separated distances in metres eg. 10,30,50)
-    :param str working_gdb: path to the working geodatabase
     :param logger: logger object for console and log file reporting
     :return:
     """
@@ -386,33 +383,34 @@ def buffer_analysis(lakes_final, lakes_criteria, buffer_dist, working_gdb, logge
     logger.info('********************************')
 
     # CHeck to see if a selection criteria was used in the first step.  If not, use all lakes going forward
-    if int(arcpy.GetCount_management(lakes_criteria).getOutput(0)) > 0:
+    if criteria_count > 0:
         lakes = lakes_criteria
+        lake_count = criteria_count
     else:
         lakes = lakes_final
+        lake_count = int(arcpy.GetCount_management(lakes).getOutput(0))
 
     # Buffer lakes using distances specified by the user
-    logger.info('Buffering {0} Lake(s) using the '
-                'following distances: {1}...'.format(int(arcpy.GetCount_management(lakes).getOutput(0)), buffer_dist))
+    logger.info('Buffering %s Lake(s) using the following distances: %s...', lake_count, buffer_dist)
 
-    buffer_lakes = os.path.join(working_gdb, 'Lakes_Buffer')
+    buffer_lakes = os.path.join(SCRATCH, 'Lakes_Buffer')
     buffer_dist = buffer_dist.replace(' ', '').replace(',', ';')
     fld_buff_dist = 'Buffer_Distance'
     fld_buff_area = 'Buffer_Area'
     fld_buff_prmtr = 'Buffer_Prmtr'
 
-    arcpy.MultipleRingBuffer_analysis(lakes, buffer_lakes, buffer_dist, 'Meters', 'distance', 'NONE', 'OUTSIDE_ONLY')
+    # The ring distance is written straight to the Buffer_Distance field by the buffer tool
+    arcpy.MultipleRingBuffer_analysis(lakes, buffer_lakes, buffer_dist, 'Meters', fld_buff_dist, 'NONE',
+                                      'OUTSIDE_ONLY')
 
     # Add geometry information
     logger.info('Add Geometry Attributes...')
-    arcpy.AddField_management(buffer_lakes, fld_buff_dist, 'DOUBLE')
-    arcpy.CalculateField_management(buffer_lakes, fld_buff_dist, '!distance!', 'PYTHON')
-    arcpy.AddField_management(buffer_lakes, fld_buff_area, 'DOUBLE')
-    arcpy.CalculateField_management(buffer_lakes, fld_buff_area, '!SHAPE.area@HECTARES!', 'PYTHON')
-    arcpy.AddField_management(buffer_lakes, fld_buff_prmtr, 'Double')
-    arcpy.CalculateField_management(buffer_lakes, fld_buff_prmtr, '!SHAPE.length@METERS!', 'PYTHON')
-
-    arcpy.DeleteField_management(buffer_lakes, 'distance')
+    add_fields(buffer_lakes, [[fld_buff_area, 'DOUBLE'], [fld_buff_prmtr, 'DOUBLE']])
+    with arcpy.da.UpdateCursor(buffer_lakes, ['SHAPE@', fld_buff_area, fld_buff_prmtr]) as u_cursor:
+        for row in u_cursor:
+            row[1] = row[0].getArea('PLANAR', 'HECTARES')
+            row[2] = row[0].getLength('PLANAR', 'METERS')
+            u_cursor.updateRow(row)
 
     logger.info('********************************')
     logger.info('Completed Step 2 - Buffer Analysis Process')
@@ -456,29 +454,18 @@ def watershed_buffer(aoi, dem, lakes, buffer_lakes, vri, roads, streams, bridges
     fld_harv_date_new = 'Harvest_Year'
     fld_proj_age_new = 'Proj_Age'
     fld_buff_dist = 'Buffer_Distance'
-    fld_buff_area = 'Buffer_Area'
-    fld_buff_prmtr = 'Buffer_Prmtr'
     fld_road_length = "Road_Length"
 
-    # Lists
-    keep_fields = ['WATERBODY_POLY_ID', 'BUFF_DIST', 'BEC_ZONE_CODE', 'BEC_SUBZONE', 'BEC_VARIANT',
-                   'HARVEST_DATE', 'PROJ_AGE_1', 'Age_Class', 'BEC_Area_Ha', 'INSIDE_X', 'INSIDE_Y',
-                   'INTERPRETATION_DATE', 'OBJECTID_1', 'OBJECTID', 'Shape', 'Shape_Area', 'Shape_Length',
-                   fld_buff_dist, fld_buff_area, fld_buff_prmtr]
-
     # Set environment settings
-    arcpy.env.overwriteOutput = True
     arcpy.env.mask = aoi
 
     # Set up path variables
     dem_aoi = os.path.join(working_gdb, 'DEM_Study_Area')
-    dem_fill = os.path.join(working_gdb, 'DEM_Fill')
     flow_dir = os.path.join(working_gdb, 'Flow_Direction')
     pour_point = os.path.join(working_gdb, 'Pour_Points')
     watersheds = os.path.join(working_gdb, 'Watersheds')
-    watershed_poly = os.path.join(working_gdb, 'Watersheds_Polygon')
+    watershed_poly = os.path.join(SCRATCH, 'Watersheds_Polygon')
     selected_watersheds = os.path.join(working_gdb, 'Selected_Watersheds')
-    lakes_buffer_watershed = os.path.join(working_gdb, 'Lakes_Buffer_Watershed')
     lakes_buffer_attributes = os.path.join(working_gdb, 'Lakes_Buffer_Attributes')
     selected_roads = os.path.join(working_gdb, 'Selected_Roads')
     selected_bridges = os.path.join(working_gdb, 'Selected_Bridges')
@@ -488,31 +475,43 @@ def watershed_buffer(aoi, dem, lakes, buffer_lakes, vri, roads, streams, bridges
     if bridges == '#':
         bridges = None
 
-    # Extract the DEM and run the watershed generation process using the lakes as pour points
-    logger.info('Clipping DEM to Study Area...')
-    out_extract = arcpy.sa.ExtractByMask(dem, aoi)
-    out_extract.save(dem_aoi)
+    # Raster environment settings, restored once the rasters are created
+    raster_env = [(setting, getattr(arcpy.env, setting))
+                  for setting in ['cellSize', 'parallelProcessingFactor', 'pyramid', 'rasterStatistics']]
+    arcpy.env.cellSize = dem
+    arcpy.env.parallelProcessingFactor = '100%'
+    try:
+        # Extract the DEM and run the watershed generation process using the lakes as pour points
+        logger.info('Clipping DEM to Study Area...')
+        out_extract = arcpy.sa.ExtractByMask(dem, aoi)
+        out_extract.save(dem_aoi)
 
-    logger.info('Filling DEM...')
-    out_fill = arcpy.sa.Fill(dem_aoi)
-    out_fill.save(dem_fill)
+        # No pyramids or statistics for the rasters deleted at the end of the step
+        arcpy.env.pyramid = 'NONE'
+        arcpy.env.rasterStatistics = 'NONE'
 
-    logger.info('Creating Flow Direction...')
-    out_flow = arcpy.sa.FlowDirection(dem_fill)
-    out_flow.save(flow_dir)
+        logger.info('Filling DEM and Creating Flow Direction...')
+        out_flow = arcpy.sa.FlowDirection(arcpy.sa.Fill(out_extract))
+        out_flow.save(flow_dir)
 
-    logger.info('Creating Pour Points from Lakes...')
-    arcpy.PolygonToRaster_conversion(lakes, fld_poly_id, pour_point, 'CELL_CENTER', 'NONE', 25)
+        logger.info('Creating Pour Points from Lakes...')
+        arcpy.PolygonToRaster_conversion(lakes, fld_poly_id, pour_point, 'CELL_CENTER', 'NONE', 25)
 
-    logger.info('Creating Watersheds...')
-    out_watershed = arcpy.sa.Watershed(flow_dir, pour_point, fld_pour_point_id)
-    out_watershed.save(watersheds)
+        logger.info('Creating Watersheds...')
+        out_watershed = arcpy.sa.Watershed(flow_dir, pour_point, fld_pour_point_id)
+        out_watershed.save(watersheds)
+    finally:
+        for setting, value in raster_env:
+            setattr(arcpy.env, setting, value)
 
     logger.info('Converting Watersheds to Polygon...')
     arcpy.RasterToPolygon_conversion(watersheds, watershed_poly, 'SIMPLIFY', fld_pour_point_id)
 
     arcpy.AddField_management(vri, fld_bec_area, 'Double')
-    arcpy.CalculateField_management(vri, fld_bec_area, '!SHAPE.area@HECTARES!', 'PYTHON')
+    with arcpy.da.UpdateCursor(vri, ['SHAPE@', fld_bec_area]) as u_cursor:
+        for row in u_cursor:
+            row[1] = row[0].getArea('PLANAR', 'HECTARES')
+            u_cursor.updateRow(row)
 
     # Cleaning up watersheds to remove small segmentation
     logger.info('Cleaning up Watersheds...')
@@ -525,60 +524,63 @@ def watershed_buffer(aoi, dem, lakes, buffer_lakes, vri, roads, streams, bridges
 
     arcpy.AlterField_management(selected_watersheds, 'gridcode', fld_poly_id, fld_poly_id)
 
-    # Using the watersheds to clip the buffer zones
-    logger.info('Clipping Buffer Zones to Watersheds...')
-    arcpy.Clip_analysis(buffer_lakes, selected_watersheds, lakes_buffer_watershed)
+    # The watershed attributes are all joined back on the poly id, so it is indexed once here
+    arcpy.AddIndex_management(selected_watersheds, fld_poly_id, 'Poly_ID_Idx')
 
-    # Intersecting the buffer zones with the VRI to get attributes
-    logger.info('Intersecting Buffer Zones with the VRI...')
-    arcpy.Intersect_analysis([lakes_buffer_watershed, vri], lakes_buffer_attributes, 'ALL')
+    # Intersecting the buffer zones with the watersheds and the VRI to get attributes
+    logger.info('Intersecting Buffer Zones with the Watersheds and VRI...')
+    arcpy.Intersect_analysis([buffer_lakes, selected_watersheds, vri], lakes_buffer_attributes, 'ALL')
 
     logger.info('Cleaning up Fields...')
     # Delete unnecessary fields
-    fc_fields = [f.name for f in arcpy.ListFields(lakes_buffer_attributes)]
-    delete_fields = list(set(fc_fields) - set(keep_fields))
-    arcpy.DeleteField_management(lakes_buffer_attributes, delete_fields)
-
-    # Loops through identified layers and alters field names.
     field_list = arcpy.ListFields(lakes_buffer_attributes)
-    for field in field_list:
-        if field.name.lower() == fld_harv_date_old:
-            arcpy.AlterField_management(lakes_buffer_attributes, field.name, fld_harv_date_new, fld_harv_date_new)
-        elif field.name.lower() == fld_proj_age_old:
-            arcpy.AlterField_management(lakes_buffer_attributes, field.name, fld_proj_age_new, 'Projected_Age_Class')
+    delete_fields = [field.name for field in field_list if field.name not in BUFFER_KEEP_FIELDS]
+    remaining_fields = [field.name for field in field_list if field.name not in delete_fields]
+    if delete_fields:
+        arcpy.DeleteField_management(lakes_buffer_attributes, delete_fields)
+
+    # Alters the harvest date and projected age field names
+    new_field_names = {fld_harv_date_old: [fld_harv_date_new, fld_harv_date_new],
+                       fld_proj_age_old: [fld_proj_age_new, 'Projected_Age_Class']}
+    alter_fields(lakes_buffer_attributes, [[field_name] + new_field_names[field_name.lower()]
+                                           for field_name in remaining_fields if field_name.lower() in new_field_names])
+
+    # Select the roads, streams and bridges within the study area
+    add_spatial_indexes([fc for fc in [roads, streams, bridges] if fc])
+    roads = select_layer_by_location(roads, 'roads_lyr', aoi)
+    streams = select_layer_by_location(streams, 'streams_lyr', aoi)
+    if bridges:
+        bridges = select_layer_by_location(bridges, 'bridges_lyr', aoi)
 
     # Intersecting the buffer zones with the roads
     logger.info('Intersecting Buffer Zones with Roads...')
     arcpy.Intersect_analysis([roads, lakes_buffer_attributes], selected_roads, 'ALL')
-    lst_buffer_dist = sorted({row[0] for row in arcpy.da.SearchCursor(lakes_buffer_attributes,
-                                                                      fld_buff_dist) if row[0]})
+    lst_buffer_dist = sorted(dist for dist in count_by_field(lakes_buffer_attributes, fld_buff_dist) if dist)
 
+    # Count the roads for every buffer distance in one pass
+    road_counts = count_by_field(selected_roads, fld_buff_dist)
     for dist in lst_buffer_dist:
-        dist_lyr = arcpy.MakeFeatureLayer_management(selected_roads, 'dist_lyr', fld_buff_dist + ' = ' + str(dist))
-        selected_count = int(arcpy.GetCount_management(dist_lyr).getOutput(0))
-        logger.info('There are {0} road(s) within the {1} metre buffer.'.format(selected_count, str(dist)))
-        arcpy.Delete_management(dist_lyr)
+        logger.info('There are %s road(s) within the %s metre buffer.', road_counts.get(dist, 0), dist)
 
     arcpy.AddField_management(selected_roads, fld_road_length, 'Double')
-    arcpy.CalculateField_management(selected_roads, fld_road_length, '!SHAPE.length@METERS!', 'PYTHON')
+    with arcpy.da.UpdateCursor(selected_roads, ['SHAPE@', fld_road_length]) as u_cursor:
+        for row in u_cursor:
+            row[1] = row[0].getLength('PLANAR', 'METERS')
+            u_cursor.updateRow(row)
 
     # Intersecting the buffer zones with the Coastal Bridges if they were input by the user
     if bridges:
         logger.info('Intersecting Buffer Zones with Coastal Bridges...')
         arcpy.Intersect_analysis([bridges, lakes_buffer_attributes], selected_bridges, 'ALL')
+        bridge_counts = count_by_field(selected_bridges, fld_buff_dist)
         for dist in lst_buffer_dist:
-            dist_lyr = arcpy.MakeFeatureLayer_management(selected_bridges, 'dist_lyr',
-                                                         fld_buff_dist + ' = ' + str(dist))
-            selected_count = int(arcpy.GetCount_management(dist_lyr).getOutput(0))
-            logger.info('There are {0} coastal bridges within the {1} metre buffer.'.format(selected_count, str(dist)))
-            arcpy.Delete_management(dist_lyr)
+            logger.info('There are %s coastal bridges within the %s metre buffer.', bridge_counts.get(dist, 0), dist)
 
     logger.info('Intersecting Buffer Zones with Streams...')
     arcpy.Intersect_analysis((lakes_buffer_attributes, streams), selected_streams, 'ALL')
 
     logger.info('Deleting Intermediate Files')
-    for fc in [dem_fill, flow_dir, watershed_poly, watersheds, pour_point, buffer_lakes, lakes_buffer_watershed]:
-        arcpy.Delete_management(fc)
+    delete_datasets([roads, streams, bridges, flow_dir, watersheds, pour_point, buffer_lakes, watershed_poly])
 
     logger.info('********************************')
     logger.info('Completed Step 3 - Watershed Buffer Characteristics Process')
@@ -588,7 +590,7 @@ def watershed_buffer(aoi, dem, lakes, buffer_lakes, vri, roads, streams, bridges
 
 
 def watershed_characteristics(watersheds, lakes, streams, tsa, tfl, vri, private, blocks,
-                              fish, roads, bec, dem, working_gdb, logger):
+                              fish, roads, bec, dem, working_gdb, approx_road_area, logger):
     """
     Adds attributes from many different files to each watershed
 
@@ -605,6 +607,7 @@ def watershed_characteristics(watersheds, lakes, streams, tsa, tfl, vri, private
     :param bec: path to BEC
     :param dem: path to DEM
     :param working_gdb: path to the output geodatabase
+    :param bool approx_road_area: approximate the road area from the road length rather than buffering the roads
     :param logger: logger object for console and log file reporting
     :return:
     """
@@ -643,24 +646,21 @@ def watershed_characteristics(watersheds, lakes, streams, tsa, tfl, vri, private
 
     # Set up path variables
     lakes_intersect = os.path.join(working_gdb, 'Lakes_Intersect')
-    lakes_dissolve = os.path.join(working_gdb, 'Lakes_Dissolve')
+    lakes_dissolve = os.path.join(SCRATCH, 'Lakes_Dissolve')
     streams_intersect = os.path.join(working_gdb, 'Watershed_Stream_Network')
-    streams_dissolve = os.path.join(working_gdb, 'Streams_Dissolve')
+    streams_dissolve = os.path.join(SCRATCH, 'Streams_Dissolve')
     bec_intersect = os.path.join(working_gdb, 'BEC_Intersect')
-    bec_label_dissolve = os.path.join(working_gdb, 'BEC_Label_Dissolve')
-    bec_zone_dissolve = os.path.join(working_gdb, 'BEC_Zone_Dissolve')
     bec_dissolve = os.path.join(working_gdb, 'BEC_Dissolve')
-    fish_intersect = os.path.join(working_gdb, 'Fish_Intersect')
-    fish_dissolve = os.path.join(working_gdb, 'Fish_Dissolve')
+    fish_intersect = os.path.join(SCRATCH, 'Fish_Intersect')
+    fish_dissolve = os.path.join(SCRATCH, 'Fish_Dissolve')
     roads_intersect = os.path.join(working_gdb, 'Roads_Intersect')
-    roads_dissolve = os.path.join(working_gdb, 'Roads_Dissolve')
-    roads_buffer = os.path.join(working_gdb, 'Roads_Buffer')
-    roads_clip = os.path.join(working_gdb, 'Roads_Clip')
-    vri_non_forest = os.path.join(working_gdb, 'VRI_NonForest')
+    roads_dissolve = os.path.join(SCRATCH, 'Roads_Dissolve')
+    roads_buffer = os.path.join(SCRATCH, 'Roads_Buffer')
+    roads_clip = os.path.join(SCRATCH, 'Roads_Clip')
+    vri_non_forest = os.path.join(SCRATCH, 'VRI_NonForest')
     vri_intersect = os.path.join(working_gdb, 'VRI_Intersect')
-    vri_dissolve = os.path.join(working_gdb, 'VRI_Dissolve')
-    slope = os.path.join(working_gdb, 'Slope')
-    slope_statistics = os.path.join(working_gdb, 'Slope_Statistics')
+    vri_dissolve = os.path.join(SCRATCH, 'VRI_Dissolve')
+    slope_statistics = os.path.join(SCRATCH, 'Slope_Statistics')
 
     tsa_fields = ['TSA_NUMBER', 'TSNMBRDSCR']
     tfl_fields = ['FOR_FL_ID']
@@ -677,216 +677,202 @@ def watershed_characteristics(watersheds, lakes, streams, tsa, tfl, vri, private
                      ['MAX', 'SLOPE_PERC_MAX'],
                      ['MEAN', 'SLOPE_PERC_MEAN']]
 
-    max_label_count = 0
-    max_zone_count = 0
-    dict_bec_label = collections.defaultdict(list)
-    dict_bec_zone = collections.defaultdict(list)
     dict_non_forest = collections.defaultdict(list)
     bec_label_fields = []
     bec_zone_fields = []
     non_forest_fields = []
 
-    arcpy.env.overwriteOutput = True
-
     # Getting statistics of lakes
     logger.info('Intersecting Watersheds with Lakes...')
     arcpy.Intersect_analysis([watersheds, lakes], lakes_intersect, 'ALL')
 
-    logger.info('Dissolving Intersected Lakes...')
-    arcpy.Dissolve_management(lakes_intersect, lakes_dissolve, [fld_poly_id],
-                              '{0} SUM;{0} MIN;{0} MAX;{1} COUNT; {2} SUM'.format(fld_area, fld_poly_id, fld_length))
-    # Add Fields
-    arcpy.AddField_management(lakes_dissolve, fld_lakes_total, 'Double')
-    arcpy.AddField_management(lakes_dissolve, fld_lakes_min, 'Double')
-    arcpy.AddField_management(lakes_dissolve, fld_lakes_max, 'Double')
-    arcpy.AddField_management(lakes_dissolve, fld_lakes_count, 'Double')
-    arcpy.AddField_management(lakes_dissolve, fld_lakes_perimeter, 'Double')
-
-    with arcpy.da.UpdateCursor(lakes_dissolve,
-                               [fld_lakes_total, fld_lakes_min, fld_lakes_max, fld_lakes_count, fld_lakes_perimeter,
-                                fld_sum_area_dissolve, fld_min_area_dissolve, fld_max_area_dissolve, fld_count_dissolve,
-                                fld_sum_length_dissolve]
-                               ) as u_cursor:
-        for row in u_cursor:
-            row[0] = row[5]/10000
-            row[1] = row[6]/10000
-            row[2] = row[7]/10000
-            row[3] = row[8]
-            row[4] = row[9]
-            u_cursor.updateRow(row)
-
-    arcpy.JoinField_management(watersheds, fld_poly_id, lakes_dissolve, fld_poly_id,
-                               [fld_lakes_total, fld_lakes_min, fld_lakes_max, fld_lakes_perimeter, fld_lakes_count])
+    logger.info('Summarizing Intersected Lakes...')
+    arcpy.Statistics_analysis(lakes_intersect, lakes_dissolve,
+                              [[fld_area, 'SUM'], [fld_area, 'MIN'], [fld_area, 'MAX'], [fld_poly_id, 'COUNT'],
+                               [fld_length, 'SUM']], fld_poly_id)
+
+    # Convert the lake statistics to hectares
+    lake_stats = arcpy.da.TableToNumPyArray(lakes_dissolve, [fld_poly_id, fld_sum_area_dissolve, fld_min_area_dissolve,
+                                                             fld_max_area_dissolve, fld_count_dissolve,
+                                                             fld_sum_length_dissolve])
+    lake_fields = numpy.zeros(len(lake_stats), dtype=[(fld_poly_id, lake_stats.dtype[fld_poly_id]),
+                                                      (fld_lakes_total, numpy.float64),
+                                                      (fld_lakes_min, numpy.float64),
+                                                      (fld_lakes_max, numpy.float64),
+                                                      (fld_lakes_perimeter, numpy.float64),
+                                                      (fld_lakes_count, numpy.float64)])
+    lake_fields[fld_poly_id] = lake_stats[fld_poly_id]
+    lake_fields[fld_lakes_total] = lake_stats[fld_sum_area_dissolve] / 10000
+    lake_fields[fld_lakes_min] = lake_stats[fld_min_area_dissolve] / 10000
+    lake_fields[fld_lakes_max] = lake_stats[fld_max_area_dissolve] / 10000
+    lake_fields[fld_lakes_perimeter] = lake_stats[fld_sum_length_dissolve]
+    lake_fields[fld_lakes_count] = lake_stats[fld_count_dissolve]
+    arcpy.da.ExtendTable(watersheds, fld_poly_id, lake_fields, fld_poly_id)
 
     # Adding Streams statistics
     logger.info('Intersecting Watersheds with Streams...')
     arcpy.Intersect_analysis([watersheds, streams], streams_intersect, 'ALL')
 
-    logger.info('Dissolving Intersected Streams...')
-    arcpy.Dissolve_management(streams_intersect, streams_dissolve, [fld_poly_id], '{0} COUNT'.format(fld_poly_id))
-
-    # Add Fields
-    arcpy.AddField_management(streams_dissolve, fld_streams_count, 'Double')
-    with arcpy.da.UpdateCursor(streams_dissolve, [fld_streams_count, fld_count_dissolve]) as u_cursor:
-        for row in u_cursor:
-            row[0] = row[1]
-            u_cursor.updateRow(row)
+    logger.info('Summarizing Intersected Streams...')
+    arcpy.Statistics_analysis(streams_intersect, streams_dissolve, [[fld_poly_id, 'COUNT']], fld_poly_id)
 
-    arcpy.JoinField_management(watersheds, fld_poly_id, streams_dissolve, fld_poly_id, [fld_streams_count])
+    stream_stats = arcpy.da.TableToNumPyArray(streams_dissolve, [fld_poly_id, fld_count_dissolve])
+    stream_fields = numpy.zeros(len(stream_stats), dtype=[(fld_poly_id, stream_stats.dtype[fld_poly_id]),
+                                                          (fld_streams_count, numpy.float64)])
+    stream_fields[fld_poly_id] = stream_stats[fld_poly_id]
+    stream_fields[fld_streams_count] = stream_stats[fld_count_dissolve]
+    arcpy.da.ExtendTable(watersheds, fld_poly_id, stream_fields, fld_poly_id)
 
     # Adding TSA fields
     logger.info('Adding TSA Attributes...')
-    add_attributes(watersheds, tsa, tsa_fields, working_gdb)
+    add_attributes(watersheds, tsa, tsa_fields)
 
     # Adding BEC attributes dynamically dependant upon how many intersect the watersheds
     logger.info('Adding BEC Attributes...')
     arcpy.Intersect_analysis([watersheds, bec], bec_intersect, 'ALL')
-    arcpy.Dissolve_management(bec_intersect, bec_dissolve, [fld_poly_id, fld_bec_label])
-    arcpy.Dissolve_management(bec_dissolve, bec_label_dissolve, [fld_poly_id], '{0} COUNT'.format(fld_bec_label))
+    arcpy.Statistics_analysis(bec_intersect, bec_dissolve, [[fld_poly_id, 'COUNT']], [fld_poly_id, fld_bec_label])
 
+    # The cursor is sorted by Poly ID so the rows of each watershed are grouped together as they are read
     with arcpy.da.SearchCursor(bec_dissolve, [fld_poly_id, fld_bec_label],
                                sql_clause=(None, 'ORDER BY {0}, {1}'.format(fld_poly_id, fld_bec_label))) as s_cursor:
-        for row in s_cursor:
-            dict_bec_label[row[0]].append(row[1])
+        dict_bec_label = {poly_id: [row[1] for row in rows]
+                          for poly_id, rows in itertools.groupby(s_cursor, key=operator.itemgetter(0))}
 
-    arcpy.Dissolve_management(bec_intersect, bec_dissolve, [fld_poly_id, fld_bec_zone])
-    arcpy.Dissolve_management(bec_dissolve, bec_zone_dissolve, [fld_poly_id],
-                              '{0} COUNT;{1} SUM'.format(fld_bec_zone, fld_area))
+    arcpy.Statistics_analysis(bec_intersect, bec_dissolve, [[fld_area, 'SUM']], [fld_poly_id, fld_bec_zone])
 
-    with arcpy.da.SearchCursor(bec_dissolve, [fld_poly_id, fld_bec_zone, fld_area],
-                               sql_clause=(None, 'ORDER BY {0}, {1}'.format(fld_poly_id,
-                                                                            fld_bec_zone, fld_area))) as s_cursor:
-        for row in s_cursor:
-            dict_bec_zone[row[0]].append([row[1], row[2]/10000])
+    with arcpy.da.SearchCursor(bec_dissolve, [fld_poly_id, fld_bec_zone, fld_sum_area_dissolve],
+                               sql_clause=(None, 'ORDER BY {0}, {1}'.format(fld_poly_id, fld_bec_zone))) as s_cursor:
+        dict_bec_zone = {poly_id: [(row[1], row[2]/10000) for row in rows]
+                         for poly_id, rows in itertools.groupby(s_cursor, key=operator.itemgetter(0))}
 
-    with arcpy.da.SearchCursor(bec_label_dissolve, ['COUNT_' + fld_bec_label]) as s_cursor:
-        for row in s_cursor:
-            if int(row[0]) > max_label_count:
-                max_label_count = int(row[0])
-
-    with arcpy.da.SearchCursor(bec_zone_dissolve, ['COUNT_' + fld_bec_zone]) as s_cursor:
-        for row in s_cursor:
-            if int(row[0]) > max_zone_count:
-                max_zone_count = int(row[0])
+    # The most labels (or zones) in a single watershed sets how many label (or zone) fields are added
+    max_label_count = max([len(labels) for labels in dict_bec_label.values()] or [0])
+    max_zone_count = max([len(zones) for zones in dict_bec_zone.values()] or [0])
 
+    bec_field_types = []
     for i in range(1, max_label_count + 1):
-        arcpy.AddField_management(watersheds, fld_new_bec_label + str(i), 'TEXT')
+        bec_field_types.append([fld_new_bec_label + str(i), 'TEXT'])
         bec_label_fields.append(fld_new_bec_label + str(i))
-
     for i in range(1, max_zone_count + 1):
-        arcpy.AddField_management(watersheds, fld_new_bec_zone + str(i), 'TEXT')
-        arcpy.AddField_management(watersheds, fld_bec_zone_area + str(i), 'DOUBLE')
-
+        bec_field_types.extend([[fld_new_bec_zone + str(i), 'TEXT'], [fld_bec_zone_area + str(i), 'DOUBLE']])
         bec_zone_fields.extend([fld_new_bec_zone + str(i), fld_bec_zone_area + str(i)])
+    add_fields(watersheds, bec_field_types)
 
-    with arcpy.da.UpdateCursor(watersheds, [fld_poly_id] + bec_label_fields) as u_cursor:
-        for row in u_cursor:
-            if row[0] in dict_bec_label.keys():
-                label_list = dict_bec_label[row[0]]
-                label_index = 1
-                for label in label_list:
-                    row[label_index] = label
-                    label_index += 1
-                u_cursor.updateRow(row)
-
-    with arcpy.da.UpdateCursor(watersheds, [fld_poly_id] + bec_zone_fields) as u_cursor:
+    # The labels and zones of each watershed are written in one pass, unused fields are left NULL
+    with arcpy.da.UpdateCursor(watersheds, [fld_poly_id] + bec_label_fields + bec_zone_fields) as u_cursor:
         for row in u_cursor:
-            if row[0] in dict_bec_zone.keys():
-                zone_list = dict_bec_zone[row[0]]
-                zone_index = 1
-                for zone in zone_list:
-                    for item in zone:
-                        row[zone_index] = item
-                        zone_index += 1
-                u_cursor.updateRow(row)
+            label_list = dict_bec_label.get(row[0])
+            zone_list = dict_bec_zone.get(row[0])
+            if label_list is None and zone_list is None:
+                continue
+            if label_list is not None:
+                row[1:len(label_list) + 1] = label_list
+            if zone_list is not None:
+                # Each zone fills a name and an area field in turn
+                zone_items = [item for zone in zone_list for item in zone]
+                row[max_label_count + 1:max_label_count + len(zone_items) + 1] = zone_items
+            u_cursor.updateRow(row)
 
     # Adding TFL attributes
     logger.info('Adding TFL Attributes...')
-    add_attributes(watersheds, tfl, tfl_fields, working_gdb)
+    add_attributes(watersheds, tfl, tfl_fields)
 
     # Adding Private Land attributes
     logger.info('Adding Private Land Attributes...')
-    add_attributes(watersheds, private, private_fields, working_gdb)
+    add_attributes(watersheds, private, private_fields)
 
     # Adding Cut Block attributes
     logger.info('Adding Cut Block Attributes...')
-    add_attributes(watersheds, blocks, block_fields, working_gdb)
+    add_attributes(watersheds, blocks, block_fields)
 
     # Adding VRI attributes
     logger.info('Adding VRI Attributes...')
-    add_attributes(watersheds, vri, vri_fields, working_gdb)
+    add_attributes(watersheds, vri, vri_fields)
 
     arcpy.Select_analysis(vri, vri_non_forest,
                           '{0} = \'N\' OR (({0} = \'V\' AND {1} = \'N\'))'.format(fld_level_1, fld_level_2))
     arcpy.Intersect_analysis([vri_non_forest, watersheds], vri_intersect, 'ALL')
-    arcpy.Dissolve_management(vri_intersect, vri_dissolve, [fld_poly_id, fld_level_1, fld_level_2])
+    arcpy.Statistics_analysis(vri_intersect, vri_dissolve, [[fld_area, 'SUM']], [fld_poly_id, fld_level_1, fld_level_2])
 
-    with arcpy.da.SearchCursor(vri_dissolve, [fld_poly_id, fld_level_1, fld_level_2, fld_area]) as s_cursor:
+    with arcpy.da.SearchCursor(vri_dissolve, [fld_poly_id, fld_level_1, fld_level_2,
+                                              fld_sum_area_dissolve]) as s_cursor:
         for row in s_cursor:
             dict_non_forest[row[0]] = [row[1], row[2], row[3]/10000]
 
-    arcpy.AddField_management(watersheds, fld_non_forest_type + '1', 'TEXT')
-    arcpy.AddField_management(watersheds, fld_non_forest_type + '2', 'TEXT')
-    arcpy.AddField_management(watersheds, fld_non_forest_area, 'DOUBLE')
     non_forest_fields.extend([fld_non_forest_type + '1', fld_non_forest_type + '2', fld_non_forest_area])
+    add_fields(watersheds, [[non_forest_fields[0], 'TEXT'], [non_forest_fields[1], 'TEXT'],
+                            [non_forest_fields[2], 'DOUBLE']])
 
+    # The level 2 type is only reported for vegetated non-forest
     with arcpy.da.UpdateCursor(watersheds, [fld_poly_id] + non_forest_fields) as u_cursor:
         for row in u_cursor:
-            if row[0] in dict_non_forest.keys():
-                non_forest = dict_non_forest[row[0]]
+            non_forest = dict_non_forest.get(row[0])
+            if non_forest is not None:
                 row[1] = non_forest[0]
                 if non_forest[0] == 'V':
                     row[2] = non_forest[1]
                 row[3] = non_forest[2]
-            u_cursor.updateRow(row)
+                u_cursor.updateRow(row)
 
     # Adding Fish Observation attributes
     logger.info('Adding Fish Observation Attributes...')
     arcpy.Intersect_analysis([watersheds, fish], fish_intersect, 'ALL')
-    arcpy.Dissolve_management(fish_intersect, fish_dissolve, [fld_poly_id, fld_fish_obs_type],
-                              '{0} COUNT'.format(fld_poly_id))
-
-    for fish_type in ['Summary', 'Observation']:
-        fish_lyr = arcpy.MakeFeatureLayer_management(fish_dissolve, 'fish_lyr',
-                                                     '{0} = \'{1}\''.format(fld_fish_obs_type, fish_type))
-        arcpy.JoinField_management(watersheds, fld_poly_id, fish_lyr, fld_poly_id, [fld_count_dissolve])
-
-        if fish_type == 'Summary':
-            use_field = fld_presence_smry
+    arcpy.Statistics_analysis(fish_intersect, fish_dissolve, [[fld_poly_id, 'COUNT']], [fld_poly_id, fld_fish_obs_type])
+
+    # The counts of each observation type are added as their own field, watersheds without that type are left NULL
+    fish_counts = arcpy.da.TableToNumPyArray(fish_dissolve, [fld_poly_id, fld_fish_obs_type, fld_count_dissolve],
+                                             null_value={fld_fish_obs_type: ''})
+    for fish_type, fish_field in [('Summary', fld_presence_smry), ('Observation', fld_presence_obs)]:
+        type_counts = fish_counts[fish_counts[fld_fish_obs_type] == fish_type]
+        if len(type_counts):
+            fish_presence = numpy.zeros(len(type_counts), dtype=[(fld_poly_id, fish_counts.dtype[fld_poly_id]),
+                                                                 (fish_field, numpy.int32)])
+            fish_presence[fld_poly_id] = type_counts[fld_poly_id]
+            fish_presence[fish_field] = type_counts[fld_count_dissolve]
+            arcpy.da.ExtendTable(watersheds, fld_poly_id, fish_presence, fld_poly_id)
         else:
-            use_field = fld_presence_obs
-
-        arcpy.AlterField_management(watersheds, fld_count_dissolve, use_field)
+            add_fields(watersheds, [[fish_field, 'LONG']])
 
     # Adding Road attributes
     logger.info('Adding Road Attributes...')
     arcpy.Intersect_analysis([watersheds, roads], roads_intersect, 'ALL')
-    arcpy.Dissolve_management(roads_intersect, roads_dissolve, fld_poly_id, '{0} SUM'.format(fld_length))
+    arcpy.Statistics_analysis(roads_intersect, roads_dissolve, [[fld_length, 'SUM']], fld_poly_id)
     arcpy.JoinField_management(watersheds, fld_poly_id, roads_dissolve, fld_poly_id, [fld_sum_length_dissolve])
     arcpy.AlterField_management(watersheds, fld_sum_length_dissolve, fld_road_length)
 
-    arcpy.Buffer_analysis(roads_intersect, roads_buffer, '3 Meters', 'FULL', 'ROUND', 'LIST', fld_poly_id, 'PLANAR')
-    arcpy.Clip_analysis(roads_buffer, watersheds, roads_clip)
-    arcpy.AddField_management(roads_clip, fld_road_area, 'DOUBLE')
-    arcpy.CalculateField_management(roads_clip, fld_road_area, '!SHAPE.area@HECTARES!', 'PYTHON')
-    arcpy.JoinField_management(watersheds, fld_poly_id, roads_clip, fld_poly_id, [fld_road_area])
+    if approx_road_area:
+        # Approximate road area from the road length and a 6 m road width
+        logger.warning('%s is approximated from the road length', fld_road_area)
+        arcpy.AddField_management(roads_dissolve, fld_road_area, 'DOUBLE', field_alias='Road Area Ha (Approximate)')
+        arcpy.CalculateField_management(roads_dissolve, fld_road_area,
+                                        '!{0}! * 6 / 10000.0'.format(fld_sum_length_dissolve), 'PYTHON')
+        arcpy.JoinField_management(watersheds, fld_poly_id, roads_dissolve, fld_poly_id, [fld_road_area])
+    else:
+        arcpy.Buffer_analysis(roads_intersect, roads_buffer, '3 Meters', 'FULL', 'ROUND', 'LIST', fld_poly_id,
+                              'PLANAR')
+        clip_features(roads_buffer, watersheds, roads_clip)
+        arcpy.AddField_management(roads_clip, fld_road_area, 'DOUBLE')
+        with arcpy.da.UpdateCursor(roads_clip, ['SHAPE@', fld_road_area]) as u_cursor:
+            for row in u_cursor:
+                row[1] = row[0].getArea('PLANAR', 'HECTARES')
+                u_cursor.updateRow(row)
+        arcpy.JoinField_management(watersheds, fld_poly_id, roads_clip, fld_poly_id, [fld_road_area])
 
     # Creating slope surface and adding attributes
     logger.info('Adding Slope Attributes...')
     slope_ras = arcpy.sa.Slope(dem, 'PERCENT_RISE')
-    slope_ras.save(slope)
 
-    slope_tab = arcpy.sa.ZonalStatisticsAsTable(watersheds, fld_poly_id, slope_ras, slope_statistics, 'DATA', 'ALL')
+    # Only the minimum, maximum and mean slope are joined to the watersheds so only those are calculated
+    arcpy.sa.ZonalStatisticsAsTable(watersheds, fld_poly_id, slope_ras, slope_statistics, 'DATA', 'MIN_MAX_MEAN')
     arcpy.JoinField_management(watersheds, fld_poly_id, slope_statistics, fld_poly_id, ['MIN', 'MAX', 'MEAN'])
 
     logger.info('Cleaning up Fields...')
     alter_fields(watersheds, rename_fields)
 
     logger.info('Deleting Intermediate Files')
-    for fc in [streams_dissolve, fish_dissolve, fish_intersect, roads_intersect, roads_dissolve, roads_buffer,
-               roads_clip, bec_intersect, bec_dissolve, bec_label_dissolve, bec_zone_dissolve, vri_dissolve,
-               vri_intersect, vri_non_forest, slope, slope_statistics, lakes_dissolve, lakes_intersect]:
-        arcpy.Delete_management(fc)
+    delete_datasets([lakes_intersect, lakes_dissolve, streams_dissolve, bec_intersect, bec_dissolve, fish_intersect,
+                     fish_dissolve, roads_intersect, roads_dissolve, roads_buffer, roads_clip, vri_non_forest,
+                     vri_intersect, vri_dissolve, slope_statistics])
 
     logger.info('********************************')
     logger.info('Completed Step 4 - Watershed Characteristics Process')
@@ -895,12 +881,13 @@ def watershed_characteristics(watersheds, lakes, streams, tsa, tfl, vri, private
     return watersheds, bec_label_fields, bec_zone_fields, non_forest_fields
 
 
-def export_tables(lakes_final, lakes_criteria, watersheds, working_gdb,
+def export_tables(lakes_final, lakes_criteria, criteria_count, watersheds, working_gdb,
                   bec_label_fields, bec_zone_fields, non_forest_fields, logger):
     """
     Export three spatial files as csv
     :param str lakes_final: path to lakes_final feature class
     :param str lakes_criteria: path to lakes criteria feature class
+    :param int criteria_count: number of lakes in the lakes criteria feature class
     :param str watersheds: path to watersheds feature class
     :param str working_gdb: path to working geodatabase
     :param bec_label_fields: list of bec label fields to include
@@ -937,65 +924,14 @@ def export_tables(lakes_final, lakes_criteria, watersheds, working_gdb,
                         'ROAD_AREA_HA', 'SLOPE_PERC_MIN', 'SLOPE_PERC_MAX', 'SLOPE_PERC_MEAN', 'Shape_Length',
                         'Shape_Area']
 
-    str_lakes = ''
-    for item in lakes_fields:
-        str_lakes += item
-        if item == lakes_fields[-1]:
-            str_lakes += '\n'
-        else:
-            str_lakes += ','
+    write_csv(final_csv, lakes_final, lakes_fields)
 
-    str_watersheds = ''
-    for item in watershed_fields:
-        str_watersheds += item
-        if item == watershed_fields[-1]:
-            str_watersheds += '\n'
-        else:
-            str_watersheds += ','
-
-    with open(final_csv, 'w') as f:
-        f.write(str_lakes)
-
-        with arcpy.da.SearchCursor(lakes_final, lakes_fields) as s_cursor:
-            for row in s_cursor:
-                csv_line = ''
-                for i in range(0, len(lakes_fields)):
-                    csv_line += str(row[i])
-                    if i < len(lakes_fields) - 1:
-                        csv_line += ','
-                    else:
-                        csv_line += '\n'
-                f.write(csv_line.replace('None', ''))
-
-    if int(arcpy.GetCount_management(lakes_criteria).getOutput(0)) > 0:
+    if criteria_count > 0:
         logger.info('Exporting Lakes_Criteria...')
-        with open(criteria_csv, 'w') as f:
-            f.write(str_lakes)
-
-            with arcpy.da.SearchCursor(lakes_criteria, lakes_fields) as s_cursor:
-                for row in s_cursor:
-                    csv_line = ''
-                    for i in range(0, len(lakes_fields)):
-                        csv_line += str(row[i])
-                        if i < len(lakes_fields) - 1:
-                            csv_line += ','
-                        else:
-                            csv_line += '\n'
-                    f.write(csv_line.replace('None', ''))
+        write_csv(criteria_csv, lakes_criteria, lakes_fields)
 
     logger.info('Exporting Selected_Watersheds...')
-    with open(watersheds_csv, 'w') as f:
-        f.write(str_watersheds)
-        with arcpy.da.SearchCursor(watersheds, watershed_fields) as s_cursor:
-            for row in s_cursor:
-                csv_line = ''
-                for i in range(0, len(watershed_fields)):
-                    csv_line += str(row[i])
-                    if i < len(watershed_fields) - 1:
-                        csv_line += ','
-                    else:
-                        csv_line += '\n'
-                f.write(csv_line.replace('None', ''))
+    write_csv(watersheds_csv, watersheds, watershed_fields)
 
     logger.info('********************************')
     logger.info('Completed Export Results')
@@ -1004,54 +940,205 @@ def export_tables(lakes_final, lakes_criteria, watersheds, working_gdb,
     return
 
 
-def add_attributes(input_fc, join_fc, fields, working_gdb):
+def write_csv(output_csv, input_table, fields):
+    """
+    Function to write the rows of a table to a csv file, with a header row of the field names
+    :param str output_csv: Path to the output csv file
+    :param str input_table: Path to the table (or feature class) to export
+    :param list fields: list of fields to export, in column order
+    :return:
+    """
+
+    # The csv module needs a binary file on Python 2 (ArcMap) and a text file without newline translation on Python 3
+    if sys.version_info[0] < 3:
+        csv_file = open(output_csv, 'wb')
+    else:
+        csv_file = open(output_csv, 'w', newline='')
+
+    with csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(fields)
+        with arcpy.da.SearchCursor(input_table, fields) as s_cursor:
+            writer.writerows(['' if value is None else value for value in row] for row in s_cursor)
+
+    return
+
+
+def add_attributes(input_fc, join_fc, fields):
     """
     Function to add specific attributes from one feature class to another
 
     :param str input_fc: Path to input feature class
     :param str join_fc: Path to join feature class
     :param list fields: list of fields to join
-    :param str working_gdb: Path to the working geodatabase
     :return:
     """
 
-    temp_fc = os.path.join(working_gdb, 'Temp_Join')
-    field_mappings = arcpy.FieldMappings()
+    temp_fc = os.path.join(SCRATCH, 'Temp_Join')
 
-    field_mappings.addTable(input_fc)
-    field_mappings.addTable(join_fc)
+    # Spatial join the requested fields and join them back on the ObjectID of the join target
+    field_mappings = build_field_mappings([join_fc], frozenset(fields))
+    arcpy.SpatialJoin_analysis(input_fc, join_fc, temp_fc, 'JOIN_ONE_TO_ONE', 'KEEP_ALL', field_mappings, 'INTERSECT')
+    arcpy.JoinField_management(input_fc, arcpy.Describe(input_fc).OIDFieldName, temp_fc, 'TARGET_FID', fields)
 
-    input_fields = [field.name for field in arcpy.ListFields(input_fc)]
-    keep_fields = input_fields + fields
+    arcpy.Delete_management(temp_fc)
 
-    for field in field_mappings.fields:
-        if field.name not in keep_fields:
-            field_mappings.removeFieldMap(field_mappings.findFieldMapIndex(field.name))
+    return
 
-    arcpy.SpatialJoin_analysis(input_fc, join_fc, temp_fc, 'JOIN_ONE_TO_ONE', 'KEEP_ALL', field_mappings, 'INTERSECT')
-    arcpy.DeleteField_management(temp_fc, ['Join_Count', 'TARGET_FID', 'OBJECTID_1'])
-    arcpy.Copy_management(temp_fc, input_fc)
-    field_mappings.removeAll()
 
-    del field_mappings
-    arcpy.Delete_management(temp_fc)
+def select_layer_by_location(input_fc, layer_name, select_fc):
+    """
+    Function to make a feature layer with the features that intersect another feature class selected
+    :param str input_fc: Path to the input feature class
+    :param str layer_name: name of the feature layer to create
+    :param str select_fc: Path to the feature class to select against
+    :return: name of the feature layer
+    """
+
+    arcpy.MakeFeatureLayer_management(input_fc, layer_name)
+    arcpy.SelectLayerByLocation_management(layer_name, 'INTERSECT', select_fc, '', 'NEW_SELECTION')
+
+    return layer_name
+
+
+def count_by_field(input_fc, case_field):
+    """
+    Function to count the features for each value of a field
+    :param str input_fc: Path to the input feature class
+    :param str case_field: field to group the features by
+    :return: dictionary of field value: feature count
+    """
+
+    stats_table = os.path.join(SCRATCH, 'Count_' + case_field)
+    arcpy.Statistics_analysis(input_fc, stats_table, [[case_field, 'COUNT']], case_field)
+    counts = {row[0]: row[1] for row in arcpy.da.SearchCursor(stats_table, [case_field, 'FREQUENCY'])}
+    arcpy.Delete_management(stats_table)
+
+    return counts
+
+
+def add_fields(input_fc, fields):
+    """
+    Function to add a list of fields to a table
+    :param str input_fc: Path to the input feature class (or table)
+    :param list fields: list of fields to add, each as [field name, field type]
+    :return:
+    """
+
+    if not fields:
+        return
+
+    if ARC_PRO:
+        arcpy.AddFields_management(input_fc, fields)
+    else:
+        for field in fields:
+            arcpy.AddField_management(input_fc, field[0], field[1])
 
     return
 
 
+def clip_features(input_fc, clip_fc, output_fc):
+    """
+    Function to clip a feature class, using the multithreaded pairwise clip where it is available
+    :param str input_fc: Path to the input feature class
+    :param str clip_fc: Path to the clip feature class
+    :param str output_fc: Path to the output feature class
+    :return:
+    """
+
+    if ARC_PRO:
+        arcpy.PairwiseClip_analysis(input_fc, clip_fc, output_fc)
+    else:
+        arcpy.Clip_analysis(input_fc, clip_fc, output_fc)
+
+    return
+
+
+def delete_datasets(datasets):
+    """
+    Function to delete a list of intermediate datasets
+    :param list datasets: list of paths (or layer names) to delete
+    :return:
+    """
+
+    # Datasets that were never created (or already removed) and optional inputs left as None are skipped
+    datasets = [dataset for dataset in datasets if dataset and arcpy.Exists(dataset)]
+    if not datasets:
+        return
+
+    if ARC_PRO:
+        arcpy.Delete_management(datasets)
+    else:
+        for dataset in datasets:
+            arcpy.Delete_management(dataset)
+
+    return
+
+
+def add_spatial_indexes(datasets):
+    """
+    Function to add a spatial index to any dataset that does not have one
+    :param list datasets: list of paths to feature classes
+    :return:
+    """
+
+    for dataset in datasets:
+        if not arcpy.Describe(dataset).hasSpatialIndex:
+            try:
+                arcpy.AddSpatialIndex_management(dataset)
+            except arcpy.ExecuteError:
+                # Read-only inputs are left as they are; the tools index them on the fly
+                pass
+
+    return
+
+
+def build_field_mappings(tables, keep_fields):
+    """
+    Function to build the field mappings for a join, keeping only a set of fields
+    :param list tables: list of tables (or layer names) to add to the field mappings, in join order
+    :param frozenset keep_fields: set of field names to keep
+    :return: FieldMappings object
+    """
+
+    field_mappings = arcpy.FieldMappings()
+    for table in tables:
+        field_mappings.addTable(table)
+
+    # Remove by index from the end so the indices of the remaining field maps stay valid
+    fields = field_mappings.fields
+    for index in range(len(fields) - 1, -1, -1):
+        if fields[index].name not in keep_fields:
+            field_mappings.removeFieldMap(index)
+
+    return field_mappings
+
+
+def sql_value_list(values):
+    """
+    Function to build a quoted, comma separated value list for a SQL IN clause
+    :param list values: list of string values (multivalue tool parameters may already be wrapped in quotes)
+    :return: string of quoted values, eg. 'LA', 'RE'
+    """
+
+    # Apostrophes within a value are doubled so names such as "Owen's Creek" stay a single SQL literal
+    return ', '.join("'{0}'".format(value.strip("'").replace("'", "''")) for value in values)
+
+
 def alter_fields(input_fc, fields):
     """
     Function to rename fields within a feature class
     :param str input_fc: Path to the input feature class
-    :param list fields: list of fields to alter
+    :param list fields: list of fields to alter, each as [current name, new name] or [current name, new name, alias]
     :return:
     """
 
-    for pair in fields:
-        cur_name = pair[0]
-        new_name = pair[1]
+    for field in fields:
+        cur_name = field[0]
+        new_name = field[1]
+        new_alias = field[2] if len(field) > 2 else ''
 
-        arcpy.AlterField_management(input_fc, cur_name, new_name)
+        arcpy.AlterField_management(input_fc, cur_name, new_name, new_alias)
 
     return
 